@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langgraph.graph import StateGraph, END
@@ -5,7 +6,8 @@ from typing import TypedDict, Annotated, List, Union
 import operator
 from app.config import settings
 from app import tools
-from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
+from langchain_core.messages import HumanMessage, AIMessage, ToolMessage, SystemMessage
+from langchain_core.runnables import RunnableConfig
 
 logging.basicConfig(
     level=logging.INFO,
@@ -20,121 +22,209 @@ tools_list = [
     tools.list_tasks,
     tools.filter_tasks,
 ]
-logger.info(f"🧰 Registered tools: {[tool.__name__ for tool in tools_list]}")
+logger.info("🧰 Registered tools: %s", [tool.__name__ for tool in tools_list])
 
-logger.info("🔧 Initializing Gemini Pro LLM...")
+# Output cap for Flash routing turns (the first model call of a turn, which mostly
+# emits tool calls). Thinking is disabled (thinking_budget=0) so the whole cap goes
+# to the visible reply / tool calls; with thinking on, thought tokens count against
+# it and turns could stop at MAX_TOKENS with empty output. Post-tool turns are
+# uncapped since they may have to render a full page of list_tasks results.
+FLASH_MAX_OUTPUT_TOKENS = 512
+
+logger.info("🔧 Initializing Gemini Flash LLM (fast path)...")
+llm_fast_base = ChatGoogleGenerativeAI(
+    model="gemini-2.5-flash",
+    google_api_key=settings.GEMINI_API_KEY,
+    thinking_budget=0,
+    n=1,
+    convert_system_message_to_human=False,
+)
+
+logger.info("🔧 Initializing Gemini Pro LLM (fallback)...")
 llm_base = ChatGoogleGenerativeAI(
     model="gemini-2.5-pro",
-    google_api_key= os.getenv("GEMINI_API_KEY")
-
+    google_api_key=settings.GEMINI_API_KEY,
+    n=1,
+    convert_system_message_to_human=False,
 )
 
+llm_fast = llm_fast_base.bind_tools(
+    tools_list, generation_config={"max_output_tokens": FLASH_MAX_OUTPUT_TOKENS}
+)
+llm_fast_uncapped = llm_fast_base.bind_tools(tools_list)
 llm = llm_base.bind_tools(tools_list)
-logger.info("✅ LLM Initialized with tools bound.")
+logger.info("✅ LLMs Initialized with tools bound.")
+
+# Inputs longer than this (or spanning several lines) are routed to Pro.
+PRO_INPUT_CHARS = 400
+PRO_INPUT_LINES = 4
+
+def select_llm(user_input: str, after_tool: bool = False):
+    if len(user_input) > PRO_INPUT_CHARS or user_input.count("\n") >= PRO_INPUT_LINES:
+        return llm
+    return llm_fast_uncapped if after_tool else llm_fast
 
 def execute_tool(tool_name: str, tool_args: dict):
-    logger.info(f"🚀 Executing tool: {tool_name} with args: {tool_args}")
+    logger.debug("🚀 Executing tool: %s with args: %s", tool_name, tool_args)
     try:
         tool_func = getattr(tools, tool_name)
         result = tool_func(**tool_args)
-        logger.info(f"✅ Tool '{tool_name}' executed successfully.")
+        logger.debug("✅ Tool '%s' executed successfully.", tool_name)
         return result
     except Exception as e:
-        logger.exception(f"❌ Tool '{tool_name}' execution failed.")
+        logger.exception("❌ Tool '%s' execution failed.", tool_name)
         return {"status": "error", "message": f"Tool execution failed: {e}"}
 
 class AgentState(TypedDict):
     input: str
-    chat_history: List[Union[HumanMessage, AIMessage, ToolMessage]]
+    chat_history: List[Union[SystemMessage, HumanMessage, AIMessage, ToolMessage]]
     agent_outcome: Union[str, List[dict], None]
     tool_calls: List[dict]
-    tasks_updated: bool
+    task_ops: Annotated[List[dict], operator.add]
+    skip_final_model: bool
 
-def call_model(state: AgentState):
+async def call_model(state: AgentState, config: RunnableConfig):
     logger.info("🧠 [Model Node] Invoking LLM...")
     
     messages = state["chat_history"].copy()
     
     current_input = state["input"]
+    after_tool = bool(messages) and isinstance(messages[-1], ToolMessage)
     if not messages or not isinstance(messages[-1], HumanMessage) or messages[-1].content != current_input:
         messages.append(HumanMessage(content=current_input))
     
-    logger.info(f"📝 Sending {len(messages)} messages to LLM")
-    for i, msg in enumerate(messages):
-        logger.info(f"   Message {i}: {type(msg).__name__} - {msg.content[:100]}...")
+    logger.info("📝 Sending %d messages to LLM", len(messages))
+    if logger.isEnabledFor(logging.DEBUG):
+        for i, msg in enumerate(messages):
+            logger.debug("   Message %d: %s - %s...", i, type(msg).__name__, msg.content[:100])
     
-    response = llm.invoke(messages)
+    response = await select_llm(current_input, after_tool).ainvoke(messages, config)
     logger.info("✅ LLM invocation complete.")
 
-    updated_chat_history = messages.copy()
-
-    tool_calls = []
-    if hasattr(response, 'tool_calls') and response.tool_calls:
-        logger.info(f"🔍 LLM requested {len(response.tool_calls)} tool(s).")
-        for tc in response.tool_calls:
-            logger.info(f"📌 Tool Call: {tc['name']} | Args: {tc['args']}")
+    response_tool_calls = getattr(response, "tool_calls", None)
+    if response_tool_calls:
+        logger.info("🔍 LLM requested %d tool(s).", len(response_tool_calls))
+        tool_calls = []
+        for tc in response_tool_calls:
+            logger.debug("📌 Tool Call: %s | Args: %s", tc['name'], tc['args'])
             tool_calls.append({
                 "name": tc['name'],
                 "args": tc['args'],
                 "id": tc['id']
             })
         
-        updated_chat_history.append(AIMessage(content=response.content or "", tool_calls=response.tool_calls))
+        messages.append(AIMessage(content=response.content or "", tool_calls=response_tool_calls))
         
         return {
             "agent_outcome": None,
             "tool_calls": tool_calls,
-            "chat_history": updated_chat_history
+            "chat_history": messages
         }
     else:
         logger.info("📨 Direct response from LLM (no tools).")
-        updated_chat_history.append(AIMessage(content=response.content))
+        messages.append(AIMessage(content=response.content))
         return {
             "agent_outcome": response.content,
             "tool_calls": [],
-            "chat_history": updated_chat_history
+            "chat_history": messages
         }
 
-def call_tool(state: AgentState):
+MUTATION_TOOLS = {"create_task", "update_task", "delete_task"}
+# Only these run concurrently; mutations keep call order since the model can emit
+# dependent calls (e.g. create "X" then update "X") in one response.
+READ_ONLY_TOOLS = {"list_tasks", "filter_tasks"}
+# Consecutive calls to these tools are collapsed into a single transaction.
+BULK_TOOLS = {"create_task": "create_tasks_bulk", "delete_task": "delete_tasks_bulk"}
+
+def _segment_tool_calls(tool_calls: List[dict]) -> List[tuple]:
+    segments = []
+    for i, tc in enumerate(tool_calls):
+        key = None if tc["name"] in READ_ONLY_TOOLS else tc["name"]
+        if segments and segments[-1][0] == key:
+            segments[-1][1].append(i)
+        else:
+            segments.append((key, [i]))
+    return segments
+
+async def run_tool_calls(tool_calls: List[dict]) -> list:
+    results = [None] * len(tool_calls)
+    for tool_name, indexes in _segment_tool_calls(tool_calls):
+        if tool_name is None:
+            outputs = await asyncio.gather(
+                *(asyncio.to_thread(execute_tool, tool_calls[i]["name"], tool_calls[i]["args"]) for i in indexes),
+                return_exceptions=True
+            )
+            for i, output in zip(indexes, outputs):
+                results[i] = output
+        elif tool_name in BULK_TOOLS and len(indexes) >= 2:
+            logger.info("📚 Batching %d '%s' calls into one transaction.", len(indexes), tool_name)
+            items = [tool_calls[i]["args"] for i in indexes]
+            output = await asyncio.to_thread(execute_tool, BULK_TOOLS[tool_name], {"items": items})
+            if isinstance(output, list):
+                for i, result in zip(indexes, output):
+                    results[i] = result
+            else:
+                for i in indexes:
+                    results[i] = output
+        else:
+            for i in indexes:
+                results[i] = await asyncio.to_thread(execute_tool, tool_name, tool_calls[i]["args"])
+    return results
+
+async def call_tool(state: AgentState):
     logger.info("🔧 [Tool Node] Executing tools from LLM request.")
     tool_calls = state["tool_calls"]
     responses = []
-    tasks_updated = False
+    task_ops = []
     
     updated_chat_history = state["chat_history"].copy()
 
-    for tool_call in tool_calls:
+    results = await run_tool_calls(tool_calls)
+
+    for tool_call, tool_response in zip(tool_calls, results):
         tool_name = tool_call["name"]
-        tool_args = tool_call["args"]
         tool_id = tool_call["id"]
         
-        try:
-            tool_response = execute_tool(tool_name, tool_args)
-            logger.info(f"📦 Tool '{tool_name}' executed with result: {tool_response}")
-            responses.append({"tool_name": tool_name, "response": tool_response})
-            
-            updated_chat_history.append(ToolMessage(
-                content=str(tool_response), 
-                tool_call_id=tool_id
-            ))
-            
-            if tool_name in ["create_task", "update_task", "delete_task"]:
-                tasks_updated = True
-                
-        except Exception as e:
-            logger.exception(f"🔥 Exception while executing tool '{tool_name}'.")
-            error_response = {"status": "error", "message": f"Tool execution failed: {e}"}
+        if isinstance(tool_response, Exception):
+            logger.error("🔥 Exception while executing tool '%s': %s", tool_name, tool_response)
+            error_response = {"status": "error", "message": f"Tool execution failed: {tool_response}"}
             responses.append({"tool_name": tool_name, "response": error_response})
             
             updated_chat_history.append(ToolMessage(
                 content=str(error_response), 
                 tool_call_id=tool_id
             ))
+            continue
+
+        logger.debug("📦 Tool '%s' executed with result: %s", tool_name, tool_response)
+        responses.append({"tool_name": tool_name, "response": tool_response})
+        
+        updated_chat_history.append(ToolMessage(
+            content=str(tool_response), 
+            tool_call_id=tool_id
+        ))
+        
+        if tool_name in MUTATION_TOOLS and tool_response.get("status") == "success" and "op" in tool_response:
+            # Deletes report the row under "deleted_task" so /ws chat feedback does not
+            # describe it as a created/updated task.
+            task = tool_response["deleted_task"] if tool_response["op"] == "delete" else tool_response["task"]
+            task_ops.append({"op": tool_response["op"], "task": task})
     
+    skip_final_model = all(
+        item["tool_name"] in MUTATION_TOOLS and item["response"].get("status") == "success"
+        for item in responses
+    )
+    if skip_final_model:
+        logger.info("⏭️ All tool calls were successful mutations; skipping final LLM turn.")
+        updated_chat_history.append(AIMessage(
+            content="\n".join(item["response"].get("message", "Success") for item in responses)
+        ))
+
     logger.info("✅ Tool execution complete.")
     return {
         "agent_outcome": responses,
-        "tasks_updated": tasks_updated,
+        "task_ops": task_ops,
+        "skip_final_model": skip_final_model,
         "chat_history": updated_chat_history
     }
 
@@ -144,6 +234,12 @@ def should_continue(state: AgentState):
     else:
         return END
 
+def should_call_model(state: AgentState):
+    if state.get("skip_final_model"):
+        return END
+    else:
+        return "model"
+
 logger.info("🔗 Creating agent workflow graph...")
 workflow = StateGraph(AgentState)
 workflow.add_node("model", call_model)
@@ -156,31 +252,80 @@ workflow.add_conditional_edges(
     {"tool": "tool", END: END}
 )
 
-workflow.add_edge("tool", "model")
+workflow.add_conditional_edges(
+    "tool",
+    should_call_model,
+    {"model": "model", END: END}
+)
 
 app_agent = workflow.compile()
 logger.info("✅ Agent graph compiled and ready.")
 
+async def process_input_stream(initial_state: AgentState):
+    """Run the agent graph, yielding ("token", delta) as the LLM streams and ("final", state) at the end."""
+    async for event in app_agent.astream_events(initial_state, version="v2"):
+        kind = event["event"]
+        if kind == "on_chat_model_stream":
+            delta = event["data"]["chunk"].content
+            if isinstance(delta, str) and delta:
+                yield "token", delta
+        elif kind == "on_chain_end" and not event.get("parent_ids"):
+            yield "final", event["data"]["output"]
+
+# Once the history grows past this many messages it is folded into a summary
+# plus the most recent MAX_HISTORY_MESSAGES.
+SUMMARIZE_HISTORY_AFTER = 40
+MAX_HISTORY_MESSAGES = 20
+
 class TaskAgent:
     def __init__(self):
         self.chat_history = []
     
+    async def _trim(self, history, max_messages: int = MAX_HISTORY_MESSAGES):
+        summary = history[0] if history and isinstance(history[0], SystemMessage) else None
+        messages = history[1:] if summary else history
+        if len(messages) <= SUMMARIZE_HISTORY_AFTER:
+            return history
+
+        # Start the window on a HumanMessage so no ToolMessage loses its tool call.
+        start = len(messages) - max_messages
+        while start < len(messages) and not isinstance(messages[start], HumanMessage):
+            start += 1
+        dropped, recent = messages[:start], messages[start:]
+
+        transcript = "\n".join(f"{type(msg).__name__}: {msg.content}" for msg in dropped)
+        if summary:
+            transcript = f"Earlier summary: {summary.content}\n{transcript}"
+        try:
+            response = await llm_fast_base.ainvoke(
+                f"Summarize this task-manager conversation in a few sentences, keeping task names, IDs and decisions:\n{transcript}"
+            )
+            summary = SystemMessage(content=f"Summary of earlier conversation: {response.content}")
+        except Exception:
+            logger.exception("❌ Failed to summarize chat history; keeping previous summary.")
+
+        logger.info("✂️ Trimmed chat history from %d to %d messages.", len(history), len(recent) + bool(summary))
+        return ([summary] if summary else []) + recent
+    
     async def process_input(self, user_input: str):
-        logger.info(f"🚦 Processing input: {user_input}")
+        logger.info("🚦 Processing input: %s", user_input)
+        
+        self.chat_history = await self._trim(self.chat_history)
         
         initial_state = {
             "input": user_input,
             "chat_history": self.chat_history.copy(),
             "tool_calls": [],
             "agent_outcome": None,
-            "tasks_updated": False
+            "task_ops": [],
+            "skip_final_model": False
         }
         
         result = await app_agent.ainvoke(initial_state)
         
         self.chat_history = result["chat_history"]
         
-        logger.info(f"🧾 Processing complete. Chat history length: {len(self.chat_history)}")
+        logger.info("🧾 Processing complete. Chat history length: %d", len(self.chat_history))
         
         return result
     
@@ -203,7 +348,6 @@ class TaskAgent:
             return "Task completed successfully."
 
 if __name__ == "__main__":
-    import asyncio
     from datetime import datetime, timedelta
 
     async def run_agent():
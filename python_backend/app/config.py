@@ -6,5 +6,7 @@ load_dotenv()
 class Settings:
     DATABASE_URL: str = os.getenv("DATABASE_URL")  # get from end
     GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY")
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "20"))
 
 settings = Settings()
\ No newline at end of file
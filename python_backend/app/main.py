@@ -1,13 +1,17 @@
 
 
-from fastapi import FastAPI, WebSocket, Depends, HTTPException, status
+from fastapi import FastAPI, WebSocket, Depends, HTTPException, Query, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from app.database import engine, Base, get_db
 from app.models import Task
-from app.agent import app_agent
+from app.agent import process_input_stream, llm_fast
+from app.serialization import task_row_to_dict, select_tasks, dump_tasks
 from app.websocket import manager
 from langchain_core.messages import HumanMessage
+from typing import Optional
 import json
 import asyncio
 import logging
@@ -18,7 +22,11 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+_format_tool_feedback = "Tool '{name}' executed: Status: {status}, Message: {msg}".format_map
+_format_task_summary = "Task details: Title: {title}, Status: {status}, Priority: {priority}".format_map
+_format_task_summary_with_id = "Task details: Title: {title}, Status: {status}, Priority: {priority}, ID: {id}".format_map
+
+app = FastAPI(default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -29,10 +37,28 @@ app.add_middleware(
 )
 logger.info("CORS middleware configured.")
 
+warmup_task: Optional[asyncio.Task] = None
+
+async def warm_up_llm():
+    logger.info("Warming up Gemini client...")
+    try:
+        await llm_fast.ainvoke([HumanMessage(content="ok")])
+        logger.info("Gemini client warm-up complete.")
+    except Exception as e:
+        logger.warning("Gemini client warm-up failed: %s", e)
+
+def init_db():
+    Base.metadata.create_all(bind=engine)
+    # create_all skips indexes on tables that already exist, so add any missing ones.
+    for index in Task.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+
 @app.on_event("startup")
 async def startup_event():
+    global warmup_task
+    warmup_task = asyncio.create_task(warm_up_llm())
     logger.info("Starting up... creating DB tables if not exist.")
-    Base.metadata.create_all(bind=engine)
+    await asyncio.to_thread(init_db)
     logger.info("Database tables created successfully.")
 
 @app.get("/")
@@ -40,56 +66,62 @@ async def read_root():
     logger.info("Root endpoint hit.")
     return {"message": "Welcome to the AI-Powered Task Management Backend!"}
 
+@app.get("/ready")
+async def ready():
+    if warmup_task is None or not warmup_task.done():
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Warming up.")
+    return {"status": "ready"}
+
 @app.get("/tasks")
-async def get_all_tasks(db: Session = Depends(get_db)):
+def get_all_tasks(
+    limit: Optional[int] = Query(None, ge=1),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db)
+):
     logger.info("Received request to fetch all tasks.")
-    tasks = db.query(Task).order_by(Task.created_at.desc()).all()
-    logger.info(f"Retrieved {len(tasks)} tasks from DB.")
+    total_count = db.query(func.count(Task.id)).scalar()
+    rows = db.execute(select_tasks().offset(offset).limit(limit)).mappings().all()
+    logger.info("Retrieved %d of %d tasks from DB.", len(rows), total_count)
     
-    tasks_data = []
-    for t in tasks:
-        task_entry = {
-            "id": t.id,
-            "title": t.title,
-            "description": t.description,
-            "status": t.status.value,
-            "due_date": t.due_date.isoformat() if t.due_date else None,
-            "priority": t.priority.value,
-            "created_at": t.created_at.isoformat(),
-            "updated_at": t.updated_at.isoformat(),
-        }
-        logger.debug(f"Task: {task_entry}")
-        tasks_data.append(task_entry)
+    tasks_data = [task_row_to_dict(r) for r in rows]
 
     logger.info("Sending task list response.")
-    return {"tasks": tasks_data}
+    return {"tasks": tasks_data, "total_count": total_count}
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket, db: Session = Depends(get_db)):
     logger.info("WebSocket connection initializing...")
     await manager.connect(websocket)
-    logger.info(f"WebSocket connected: {websocket.client}")
+    logger.info("WebSocket connected: %s", websocket.client)
 
     try:
         while True:
             data = await websocket.receive_text()
-            logger.info(f"Received WebSocket data: {data}")
+            logger.info("Received WebSocket data: %s", data)
 
             message = json.loads(data)
 
             if message["type"] == "chat_message":
                 user_message_content = message["content"]
-                logger.info(f"Processing user message: {user_message_content}")
+                logger.info("Processing user message: %s", user_message_content)
 
                 chat_history = [HumanMessage(content=user_message_content)]
                 logger.info("Invoking agent with chat history...")
-                agent_output = await app_agent.ainvoke(
-                    {"input": user_message_content, "chat_history": chat_history}
-                )
+                agent_output = {}
+                async for kind, payload in process_input_stream(
+                    {"input": user_message_content, "chat_history": chat_history, "task_ops": []}
+                ):
+                    if kind == "token":
+                        await manager.send_personal_message(json.dumps({
+                            "type": "chat_token",
+                            "sender": "agent",
+                            "delta": payload
+                        }), websocket)
+                    elif kind == "final":
+                        agent_output = payload
                 logger.info("Agent response received.")
 
                 ai_response_content = "I'm processing your request..."
-                tasks_updated_flag = False
 
                 if "agent_outcome" in agent_output:
                     outcome = agent_output["agent_outcome"]
@@ -99,7 +131,7 @@ async def websocket_endpoint(websocket: WebSocket, db: Session = Depends(get_db)
                         ai_response_content = outcome
                         logger.info("Agent returned string response.")
                     elif isinstance(outcome, list) and all(isinstance(item, dict) for item in outcome):
-                        logger.info(f"Processing list of tool responses ({len(outcome)} items).")
+                        logger.info("Processing list of tool responses (%d items).", len(outcome))
                         tool_messages = []
 
                         for item in outcome:
@@ -108,60 +140,48 @@ async def websocket_endpoint(websocket: WebSocket, db: Session = Depends(get_db)
                             status_msg = response_data.get("status", "unknown")
                             message_msg = response_data.get("message", "No specific message.")
 
-                            logger.info(f"Tool '{tool_name}' executed with status: {status_msg}")
-                            tool_feedback = f"Tool '{tool_name}' executed: Status: {status_msg}, Message: {message_msg}"
-                            tool_messages.append(tool_feedback)
+                            logger.debug("Tool '%s' executed with status: %s", tool_name, status_msg)
+                            tool_messages.append(_format_tool_feedback(
+                                {"name": tool_name, "status": status_msg, "msg": message_msg}
+                            ))
 
                             if status_msg == "success" and "task" in response_data:
                                 task_info = response_data["task"]
-                                logger.info(f"Task created/updated by tool: {task_info}")
-                                task_summary = f"Task details: Title: {task_info.get('title')}, Status: {task_info.get('status')}, Priority: {task_info.get('priority')}"
-                                if task_info.get('id'):
-                                    task_summary += f", ID: {task_info['id']}"
-                                tool_messages.append(task_summary)
+                                logger.debug("Task created/updated by tool: %s", task_info)
+                                tool_messages.append(
+                                    (_format_task_summary_with_id if task_info.get("id") else _format_task_summary)(task_info)
+                                )
                             elif status_msg == "error":
-                                logger.error(f"Error from tool '{tool_name}': {message_msg}")
+                                logger.error("Error from tool '%s': %s", tool_name, message_msg)
                         ai_response_content = "\n".join(tool_messages)
                     else:
-                        logger.warning(f"Unexpected agent_outcome format: {outcome}")
+                        logger.warning("Unexpected agent_outcome format: %s", outcome)
                         ai_response_content = "The agent had an unexpected outcome."
 
-                if agent_output.get("tasks_updated", False):
-                    logger.info("tasks_updated flag is True. Will refresh task list.")
-                    tasks_updated_flag = True
-
                 await manager.send_personal_message(json.dumps({
-                    "type": "chat_message",
+                    "type": "chat_message_end",
                     "sender": "agent",
                     "content": ai_response_content
                 }), websocket)
                 logger.info("Sent AI response to client.")
 
-                if tasks_updated_flag:
-                    logger.info("Preparing to send updated task list to all clients.")
-                    await asyncio.sleep(0.05)
-                    tasks = db.query(Task).order_by(Task.created_at.desc()).all()
-                    tasks_data = [
-                        {
-                            "id": t.id,
-                            "title": t.title,
-                            "description": t.description,
-                            "status": t.status.value,
-                            "due_date": t.due_date.isoformat() if t.due_date else None,
-                            "priority": t.priority.value,
-                            "created_at": t.created_at.isoformat(),
-                            "updated_at": t.updated_at.isoformat(),
-                        }
-                        for t in tasks
-                    ]
+                task_ops = agent_output.get("task_ops") or []
+                if task_ops:
+                    logger.info("Broadcasting %d task change(s) to all clients.", len(task_ops))
                     await manager.broadcast_json({
-                        "type": "task_list_update",
-                        "tasks": tasks_data
+                        "type": "task_delta",
+                        "ops": task_ops
                     })
-                    logger.info("Broadcasted updated task list to all connected clients.")
+                    logger.info("Broadcasted task delta to all connected clients.")
+
+            elif message["type"] == "resync":
+                logger.info("Client requested a full task list resync.")
+                rows = await asyncio.to_thread(lambda: db.execute(select_tasks()).mappings().all())
+                await manager.send_personal_message(dump_tasks(rows).decode(), websocket)
+                logger.info("Sent full task list to client.")
 
     except Exception as e:
-        logger.exception(f"WebSocket Error for client {websocket.client}: {e}")
+        logger.exception("WebSocket Error for client %s: %s", websocket.client, e)
         try:
             await websocket.send_json({
                 "type": "error",
@@ -171,4 +191,4 @@ async def websocket_endpoint(websocket: WebSocket, db: Session = Depends(get_db)
             logger.warning("Failed to send error message to client.")
     finally:
         manager.disconnect(websocket)
-        logger.info(f"WebSocket disconnected: {websocket.client}")
\ No newline at end of file
+        logger.info("WebSocket disconnected: %s", websocket.client)
\ No newline at end of file
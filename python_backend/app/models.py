@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, func, Enum, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, func, Enum
 from app.database import Base
 import datetime
 import enum
@@ -17,12 +17,15 @@ class TaskPriority(str, enum.Enum):
 
 class Task(Base):
     __tablename__ = "tasks"
+    # Fetch the server-generated timestamps via INSERT/UPDATE ... RETURNING so
+    # writes don't need a db.refresh() round trip.
+    __mapper_args__ = {"eager_defaults": True}
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True, nullable=False)
     description = Column(String, nullable=True)
-    status = Column(Enum(TaskStatus), default=TaskStatus.TODO, nullable=False)
+    status = Column(Enum(TaskStatus), default=TaskStatus.TODO, nullable=False, index=True)
     due_date = Column(DateTime, nullable=True)
-    priority = Column(Enum(TaskPriority), default=TaskPriority.MEDIUM, nullable=False)
-    created_at = Column(DateTime, default=func.now(), nullable=False)
+    priority = Column(Enum(TaskPriority), default=TaskPriority.MEDIUM, nullable=False, index=True)
+    created_at = Column(DateTime, default=func.now(), nullable=False, index=True)
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now(), nullable=False)
\ No newline at end of file
@@ -0,0 +1,47 @@
+import orjson
+from typing import Dict, Iterable, Union
+from sqlalchemy import select
+from sqlalchemy.engine import RowMapping
+from app.models import Task
+
+TASK_COLUMNS = (
+    Task.id,
+    Task.title,
+    Task.description,
+    Task.status,
+    Task.due_date,
+    Task.priority,
+    Task.created_at,
+    Task.updated_at,
+)
+
+def task_to_dict(t: Task) -> Dict[str, Union[str, int, None]]:
+    return {
+        "id": t.id,
+        "title": t.title,
+        "description": t.description,
+        "status": t.status.value,
+        "due_date": t.due_date.isoformat() if t.due_date else None,
+        "priority": t.priority.value,
+        "created_at": t.created_at.isoformat(),
+        "updated_at": t.updated_at.isoformat(),
+    }
+
+def task_row_to_dict(r: RowMapping) -> Dict[str, Union[str, int, None]]:
+    return {
+        **r,
+        "status": r["status"].value,
+        "due_date": r["due_date"].isoformat() if r["due_date"] else None,
+        "priority": r["priority"].value,
+        "created_at": r["created_at"].isoformat(),
+        "updated_at": r["updated_at"].isoformat(),
+    }
+
+def select_tasks():
+    return select(*TASK_COLUMNS).order_by(Task.created_at.desc())
+
+def dump_tasks(rows: Iterable[RowMapping]) -> bytes:
+    return orjson.dumps({
+        "type": "task_list_update",
+        "tasks": [task_row_to_dict(r) for r in rows]
+    })
\ No newline at end of file
@@ -1,13 +1,59 @@
-
-from sqlalchemy.orm import Session
+from sqlalchemy import func
+from app.database import SessionLocal
 from app.models import Task, TaskStatus, TaskPriority
+from app.serialization import task_to_dict, task_row_to_dict, select_tasks
 from datetime import datetime
+from functools import lru_cache
+import re
 from typing import Optional, List, Dict, Union
-from sqlalchemy import or_
 
-def get_db_session_for_tool():
-    from app.database import SessionLocal
-    return SessionLocal()
+_STATUS_MAP = {key: m for m in TaskStatus for key in (m.name, m.value)}
+_PRIORITY_MAP = {key: m for m in TaskPriority for key in (m.name, m.value)}
+_YMD_RE = re.compile(r"\d{4}-\d{2}-\d{2}", re.ASCII)
+
+@lru_cache(maxsize=512)
+def _parse_ymd(s: str) -> datetime:
+    if not _YMD_RE.fullmatch(s):
+        raise ValueError(f"Expected YYYY-MM-DD, got {s!r}")
+    return datetime.fromisoformat(s)
+
+def _build_task(
+    title: str,
+    description: Optional[str] = None,
+    due_date: Optional[str] = None,
+    priority: Optional[str] = None
+) -> Union[Task, Dict[str, str]]:
+    parsed_due_date = None
+    if due_date:
+        try:
+            parsed_due_date = _parse_ymd(due_date)
+        except ValueError:
+            return {"status": "error", "message": "Invalid due_date format. Use YYYY-MM-DD."}
+
+    parsed_priority = _PRIORITY_MAP.get(priority.upper()) if priority else TaskPriority.MEDIUM
+    if parsed_priority is None:
+        return {"status": "error", "message": f"Invalid priority: {priority}. Must be one of {list(TaskPriority)}."}
+
+    return Task(
+        title=title,
+        description=description,
+        due_date=parsed_due_date,
+        priority=parsed_priority,
+        status=TaskStatus.TODO 
+    )
+
+def _created_response(task: Task) -> Dict[str, Union[str, Dict]]:
+    return {"status": "success", "message": f"Task '{task.title}' created successfully with ID {task.id}.", "op": "create", "task": task_to_dict(task)}
+
+def _find_task(db, task_id: Optional[int], title_match: Optional[str], exclude_ids=()) -> Optional[Task]:
+    query = db.query(Task)
+    if exclude_ids:
+        query = query.filter(Task.id.notin_(list(exclude_ids)))
+    if task_id:
+        return query.filter(Task.id == task_id).first()
+    elif title_match:
+        return query.filter(Task.title.ilike(f"%{title_match}%")).first()
+    return None
 
 def create_task(
     title: str,
@@ -15,47 +61,40 @@ def create_task(
     due_date: Optional[str] = None,
     priority: Optional[str] = None
 ) -> Dict[str, Union[str, int, bool, Dict]]:
-    db = get_db_session_for_tool()
+    new_task = _build_task(title, description, due_date, priority)
+    if isinstance(new_task, dict):
+        return new_task
+
     try:
-        parsed_due_date = None
-        if due_date:
-            try:
-                parsed_due_date = datetime.strptime(due_date, "%Y-%m-%d")
-            except ValueError:
-                return {"status": "error", "message": "Invalid due_date format. Use YYYY-MM-DD."}
-
-        parsed_priority = TaskPriority.MEDIUM
-        if priority:
-            try:
-                parsed_priority = TaskPriority[priority.upper()]
-            except KeyError:
-                return {"status": "error", "message": f"Invalid priority: {priority}. Must be one of {list(TaskPriority)}."}
-
-        new_task = Task(
-            title=title,
-            description=description,
-            due_date=parsed_due_date,
-            priority=parsed_priority,
-            status=TaskStatus.TODO 
-        )
-        db.add(new_task)
-        db.commit()
-        db.refresh(new_task)
-        return {"status": "success", "message": f"Task '{new_task.title}' created successfully with ID {new_task.id}.", "task": {
-                "id": new_task.id,
-                "title": new_task.title,
-                "description": new_task.description,
-                "status": new_task.status.value,
-                "due_date": new_task.due_date.isoformat() if new_task.due_date else None,
-                "priority": new_task.priority.value,
-                "created_at": new_task.created_at.isoformat(),
-                "updated_at": new_task.updated_at.isoformat(),
-            }}
+        with SessionLocal.begin() as db:
+            db.add(new_task)
+            db.flush()
+            return _created_response(new_task)
     except Exception as e:
-        db.rollback()
         return {"status": "error", "message": f"Failed to create task: {str(e)}"}
-    finally:
-        db.close()
+
+def create_tasks_bulk(items: List[Dict]) -> List[Dict[str, Union[str, int, bool, Dict]]]:
+    results = []
+    new_tasks = []
+    for item in items:
+        try:
+            built = _build_task(**item)
+        except Exception as e:
+            built = {"status": "error", "message": f"Tool execution failed: {e}"}
+        results.append(built)
+        if isinstance(built, Task):
+            new_tasks.append(built)
+
+    if not new_tasks:
+        return results
+    try:
+        with SessionLocal.begin() as db:
+            db.add_all(new_tasks)
+            db.flush()
+            return [_created_response(r) if isinstance(r, Task) else r for r in results]
+    except Exception as e:
+        error = {"status": "error", "message": f"Failed to create task: {str(e)}"}
+        return [error if isinstance(r, Task) else r for r in results]
 
 def update_task(
     task_id: Optional[int] = None,
@@ -66,101 +105,88 @@ def update_task(
     new_due_date: Optional[str] = None,
     new_priority: Optional[str] = None
 ) -> Dict[str, Union[str, int, bool, Dict]]:
-    db = get_db_session_for_tool()
+    parsed_status = _STATUS_MAP.get(new_status.upper()) if new_status else None
+    if new_status and parsed_status is None:
+        return {"status": "error", "message": f"Invalid status: {new_status}. Must be one of {list(TaskStatus)}."}
+    parsed_due_date = None
+    if new_due_date:
+        try:
+            parsed_due_date = _parse_ymd(new_due_date)
+        except ValueError:
+            return {"status": "error", "message": "Invalid new_due_date format. Use YYYY-MM-DD."}
+    parsed_priority = _PRIORITY_MAP.get(new_priority.upper()) if new_priority else None
+    if new_priority and parsed_priority is None:
+        return {"status": "error", "message": f"Invalid new_priority: {new_priority}. Must be one of {list(TaskPriority)}."}
+
     try:
-        task = None
-        if task_id:
-            task = db.query(Task).filter(Task.id == task_id).first()
-        elif title_match:
-            task = db.query(Task).filter(Task.title.ilike(f"%{title_match}%")).first()
-
-        if not task:
-            return {"status": "error", "message": f"Task not found with ID {task_id or title_match}."}
-
-        if new_title:
-            task.title = new_title
-        if new_description:
-            task.description = new_description
-        if new_status:
-            try:
-                task.status = TaskStatus[new_status.upper()]
-            except KeyError:
-                return {"status": "error", "message": f"Invalid status: {new_status}. Must be one of {list(TaskStatus)}."}
-        if new_due_date:
-            try:
-                task.due_date = datetime.strptime(new_due_date, "%Y-%m-%d")
-            except ValueError:
-                return {"status": "error", "message": "Invalid new_due_date format. Use YYYY-MM-DD."}
-        if new_priority:
-            try:
-                task.priority = TaskPriority[new_priority.upper()]
-            except KeyError:
-                return {"status": "error", "message": f"Invalid new_priority: {new_priority}. Must be one of {list(TaskPriority)}."}
-
-        db.commit()
-        db.refresh(task)
-        return {"status": "success", "message": f"Task '{task.title}' updated successfully.", "task": {
-                "id": task.id,
-                "title": task.title,
-                "description": task.description,
-                "status": task.status.value,
-                "due_date": task.due_date.isoformat() if task.due_date else None,
-                "priority": task.priority.value,
-                "created_at": task.created_at.isoformat(),
-                "updated_at": task.updated_at.isoformat(),
-            }}
+        with SessionLocal.begin() as db:
+            task = _find_task(db, task_id, title_match)
+
+            if not task:
+                return {"status": "error", "message": f"Task not found with ID {task_id or title_match}."}
+
+            if new_title:
+                task.title = new_title
+            if new_description:
+                task.description = new_description
+            if parsed_status:
+                task.status = parsed_status
+            if parsed_due_date:
+                task.due_date = parsed_due_date
+            if parsed_priority:
+                task.priority = parsed_priority
+
+            db.flush()
+            return {"status": "success", "message": f"Task '{task.title}' updated successfully.", "op": "update", "task": task_to_dict(task)}
     except Exception as e:
-        db.rollback()
         return {"status": "error", "message": f"Failed to update task: {str(e)}"}
-    finally:
-        db.close()
 
 def delete_task(
     task_id: Optional[int] = None,
     title_match: Optional[str] = None
 ) -> Dict[str, Union[str, int, bool]]:
-    db = get_db_session_for_tool()
     try:
-        task = None
-        if task_id:
-            task = db.query(Task).filter(Task.id == task_id).first()
-        elif title_match:
-            task = db.query(Task).filter(Task.title.ilike(f"%{title_match}%")).first()
-
-        if not task:
-            return {"status": "error", "message": f"Task not found with ID {task_id or title_match}."}
-
-        db.delete(task)
-        db.commit()
-        return {"status": "success", "message": f"Task '{task.title}' (ID: {task.id}) deleted successfully."}
+        with SessionLocal.begin() as db:
+            task = _find_task(db, task_id, title_match)
+
+            if not task:
+                return {"status": "error", "message": f"Task not found with ID {task_id or title_match}."}
+
+            deleted_task = task_to_dict(task)
+            db.delete(task)
+            return {"status": "success", "message": f"Task '{task.title}' (ID: {task.id}) deleted successfully.", "op": "delete", "deleted_task": deleted_task}
     except Exception as e:
-        db.rollback()
         return {"status": "error", "message": f"Failed to delete task: {str(e)}"}
-    finally:
-        db.close()
 
-def list_tasks() -> Dict[str, Union[str, List[Dict]]]:
-    db = get_db_session_for_tool()
+def delete_tasks_bulk(items: List[Dict]) -> List[Dict[str, Union[str, int, bool, Dict]]]:
     try:
-        tasks = db.query(Task).order_by(Task.created_at.desc()).all()
-        tasks_data = [
-            {
-                "id": t.id,
-                "title": t.title,
-                "description": t.description,
-                "status": t.status.value,
-                "due_date": t.due_date.isoformat() if t.due_date else None,
-                "priority": t.priority.value,
-                "created_at": t.created_at.isoformat(),
-                "updated_at": t.updated_at.isoformat(),
-            }
-            for t in tasks
-        ]
-        return {"status": "success", "tasks": tasks_data}
+        with SessionLocal.begin() as db:
+            results = []
+            ids = set()
+            for item in items:
+                task_id, title_match = item.get("task_id"), item.get("title_match")
+                # Skip tasks already claimed by earlier items, as sequential deletes would.
+                task = _find_task(db, task_id, title_match, exclude_ids=ids)
+                if not task:
+                    results.append({"status": "error", "message": f"Task not found with ID {task_id or title_match}."})
+                    continue
+                ids.add(task.id)
+                results.append({"status": "success", "message": f"Task '{task.title}' (ID: {task.id}) deleted successfully.", "op": "delete", "deleted_task": task_to_dict(task)})
+
+            if ids:
+                db.query(Task).filter(Task.id.in_(list(ids))).delete(synchronize_session=False)
+            return results
+    except Exception as e:
+        return [{"status": "error", "message": f"Failed to delete task: {str(e)}"} for _ in items]
+
+def list_tasks(limit: int = 25, offset: int = 0) -> Dict[str, Union[str, int, List[Dict]]]:
+    try:
+        with SessionLocal.begin() as db:
+            total_count = db.query(func.count(Task.id)).scalar()
+            rows = db.execute(select_tasks().offset(offset).limit(limit)).mappings().all()
+            return {"status": "success", "tasks": [task_row_to_dict(r) for r in rows], "total_count": total_count}
     except Exception as e:
         return {"status": "error", "message": f"Failed to list tasks: {str(e)}"}
-    finally:
-        db.close()
 
 def filter_tasks(
     status: Optional[str] = None,
@@ -168,49 +194,31 @@ def filter_tasks(
     due_date_before: Optional[str] = None,
     due_date_after: Optional[str] = None
 ) -> Dict[str, Union[str, List[Dict]]]:
-    db = get_db_session_for_tool()
+    filters = []
+    if status:
+        parsed_status = _STATUS_MAP.get(status.upper())
+        if parsed_status is None:
+            return {"status": "error", "message": f"Invalid status for filter: {status}. Must be one of {list(TaskStatus)}."}
+        filters.append(Task.status == parsed_status)
+    if priority:
+        parsed_priority = _PRIORITY_MAP.get(priority.upper())
+        if parsed_priority is None:
+            return {"status": "error", "message": f"Invalid priority for filter: {priority}. Must be one of {list(TaskPriority)}."}
+        filters.append(Task.priority == parsed_priority)
+    if due_date_before:
+        try:
+            filters.append(Task.due_date <= _parse_ymd(due_date_before))
+        except ValueError:
+            return {"status": "error", "message": "Invalid due_date_before format. Use YYYY-MM-DD."}
+    if due_date_after:
+        try:
+            filters.append(Task.due_date >= _parse_ymd(due_date_after))
+        except ValueError:
+            return {"status": "error", "message": "Invalid due_date_after format. Use YYYY-MM-DD."}
+
     try:
-        query = db.query(Task)
-
-        if status:
-            try:
-                query = query.filter(Task.status == TaskStatus[status.upper()])
-            except KeyError:
-                return {"status": "error", "message": f"Invalid status for filter: {status}. Must be one of {list(TaskStatus)}."}
-        if priority:
-            try:
-                query = query.filter(Task.priority == TaskPriority[priority.upper()])
-            except KeyError:
-                return {"status": "error", "message": f"Invalid priority for filter: {priority}. Must be one of {list(TaskPriority)}."}
-        if due_date_before:
-            try:
-                parsed_date = datetime.strptime(due_date_before, "%Y-%m-%d")
-                query = query.filter(Task.due_date <= parsed_date)
-            except ValueError:
-                return {"status": "error", "message": "Invalid due_date_before format. Use YYYY-MM-DD."}
-        if due_date_after:
-            try:
-                parsed_date = datetime.strptime(due_date_after, "%Y-%m-%d")
-                query = query.filter(Task.due_date >= parsed_date)
-            except ValueError:
-                return {"status": "error", "message": "Invalid due_date_after format. Use YYYY-MM-DD."}
-
-        tasks = query.order_by(Task.created_at.desc()).all()
-        tasks_data = [
-            {
-                "id": t.id,
-                "title": t.title,
-                "description": t.description,
-                "status": t.status.value,
-                "due_date": t.due_date.isoformat() if t.due_date else None,
-                "priority": t.priority.value,
-                "created_at": t.created_at.isoformat(),
-                "updated_at": t.updated_at.isoformat(),
-            }
-            for t in tasks
-        ]
-        return {"status": "success", "tasks": tasks_data}
+        with SessionLocal.begin() as db:
+            rows = db.execute(select_tasks().where(*filters)).mappings().all()
+            return {"status": "success", "tasks": [task_row_to_dict(r) for r in rows]}
     except Exception as e:
-        return {"status": "error", "message": f"Failed to filter tasks: {str(e)}"}
-    finally:
-        db.close()
\ No newline at end of file
+        return {"status": "error", "message": f"Failed to filter tasks: {str(e)}"}
\ No newline at end of file
@@ -32,9 +32,13 @@
 
 
 
-from typing import List, Dict
+import asyncio
+import orjson
+from typing import List, Dict, Union
 from fastapi import WebSocket
 
+BROADCAST_SEND_TIMEOUT = 2.0
+
 class ConnectionManager:
     def __init__(self):
         self.active_connections: List[WebSocket] = []
@@ -45,18 +49,31 @@ class ConnectionManager:
         print(f"WebSocket connected: {websocket.client}")
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
-        print(f"WebSocket disconnected: {websocket.client}")
+        if websocket in self.active_connections:
+            self.active_connections.remove(websocket)
+            print(f"WebSocket disconnected: {websocket.client}")
 
     async def send_personal_message(self, message: str, websocket: WebSocket):
         await websocket.send_text(message)
 
-    async def broadcast_json(self, data: Dict):
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(data)
-            except RuntimeError as e:
-                print(f"Error sending to WebSocket {connection.client}: {e}. Disconnecting dead client.")
+    async def broadcast_json(self, data: Union[Dict, bytes]):
+        # Serialize once for all clients; sent as text frames so clients keep receiving JSON text.
+        payload = (data if isinstance(data, bytes) else orjson.dumps(data)).decode()
+        connections = list(self.active_connections)
+        results = await asyncio.gather(
+            *(asyncio.wait_for(c.send_text(payload), timeout=BROADCAST_SEND_TIMEOUT) for c in connections),
+            return_exceptions=True
+        )
+        for connection, result in zip(connections, results):
+            if isinstance(result, Exception):
+                print(f"Error sending to WebSocket {connection.client}: {result!r}. Disconnecting dead client.")
                 self.disconnect(connection)
+                if isinstance(result, asyncio.TimeoutError):
+                    # The socket is still open (and may hold a partial frame); close it so
+                    # the client reconnects and resyncs instead of silently missing updates.
+                    try:
+                        await asyncio.wait_for(connection.close(code=1011), timeout=BROADCAST_SEND_TIMEOUT)
+                    except Exception as e:
+                        print(f"Error closing timed-out WebSocket {connection.client}: {e!r}.")
 
 manager = ConnectionManager()
\ No newline at end of file